@@ -1,104 +1,138 @@
 import os
+import sys
 import time
-import json
 from ipaddress import IPv4Network
-from fabrictestbed_extensions.fablib.fablib import FablibManager as fablib_manager
+from concurrent.futures import ThreadPoolExecutor, wait
 
-fab_dir = os.path.expanduser('~/.fabric')
-os.makedirs(fab_dir, exist_ok=True)
-
-os.environ['FABRIC_TOKEN_LOCATION'] = os.path.join(fab_dir, 'id_token.json')
-os.environ['FABRIC_BASTION_KEY_LOCATION'] = os.path.join(fab_dir, 'bastion_key')
-os.environ['FABRIC_SLICE_PRIVATE_KEY_FILE'] = os.path.join(fab_dir, 'slice_key')
-os.environ['FABRIC_SLICE_PUBLIC_KEY_FILE'] = os.path.join(fab_dir, 'slice_key.pub')
+# Import fabric_common as a top-level module, exactly as scripts/run_experiment_only.py
+# does when run from scripts/, whatever the working directory
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'scripts'))
+from fabric_common import configure_fabric_env, get_fablib, is_slice_not_found, save_slice_cache, write_json
 
+configure_fabric_env()
 os.environ['FABRIC_LOG_LEVEL'] = os.environ.get('FABRIC_LOG_LEVEL', 'CRITICAL')
 os.environ['FABRIC_QUIET'] = 'True'
 
+def _wait_deleted(fablib, name, timeout=120):
+    """Poll until the named slice is gone (NotFound) or Dead/Closed."""
+    deadline = time.monotonic() + timeout
+    backoff = 0.5
+    while time.monotonic() < deadline:
+        try:
+            slice = fablib.get_slice(name=name)
+        except Exception as e:
+            if is_slice_not_found(e):
+                return
+            raise
+        if slice.get_state() in ("Dead", "Closed"):
+            return
+        time.sleep(backoff)
+        backoff = min(backoff * 2, 5.0)
+    raise TimeoutError(f"Slice {name} still present {timeout}s after delete")
+
+# Constraints
+CORES = 2
+RAM = 10
+DISK = 10  # Max allowed without VM.NoLimitDisk tag
+IMAGE = 'default_ubuntu_20'
+SITE = 'SALT'
+
+GPU_MODEL = 'GPU_TeslaT4'
+GPU_NAME = 'Tesla T4'
+
+SUBNET = IPv4Network('192.168.10.0/24')
+NODE_NAMES = ('gamer-a', 'receiver-b', 'router-c', 'attacker-d')
+
+def _add_cpu_node(slice, name, site=SITE):
+    """Adds a node with one NIC_Basic port and returns that interface."""
+    node = slice.add_node(name=name, site=site, cores=CORES, ram=RAM, disk=DISK, image=IMAGE)
+    return node.add_component(model='NIC_Basic', name='nic1').get_interfaces()[0]
+
+def _add_gpu_node(slice, name, site=SITE, gpu_model=GPU_MODEL):
+    """Same as _add_cpu_node, with a GPU attached ahead of the NIC."""
+    node = slice.add_node(name=name, site=site, cores=CORES, ram=RAM, disk=DISK, image=IMAGE)
+    node.add_component(model=gpu_model, name='gpu1')
+    return node.add_component(model='NIC_Basic', name='nic1').get_interfaces()[0]
+
+def _assign_ip(node, net_name, addr):
+    """Address and raise the interface in one SSH exec (ip_addr_add + ip_link_up would be two).
+
+    Runs per node from _configure_network's pool, after submit() has finished post-boot config.
+    """
+    dev = node.get_interface(network_name=net_name).get_device_name()
+    node.execute(f"sudo ip addr add {addr}/{SUBNET.prefixlen} dev {dev} && sudo ip link set dev {dev} up",
+                 quiet=True)
+
+def _configure_network(nodes, cfg, timeout=600):
+    """Address all nodes concurrently; a hung SSH exec fails provisioning instead of blocking it."""
+    ex = ThreadPoolExecutor(max_workers=len(cfg))
+    futures = []
+    for name, addr in cfg:
+        print(f"Configuring Network on {name}...")
+        futures.append(ex.submit(_assign_ip, nodes[name], 'gaming_net', addr))
+    done, not_done = wait(futures, timeout=timeout)
+    if not_done:
+        # Don't let the executor's exit join the hung calls before the error surfaces
+        ex.shutdown(wait=False, cancel_futures=True)
+        raise TimeoutError(f"{len(not_done)} node(s) still configuring after {timeout}s")
+    ex.shutdown()
+    for f in done:
+        f.result()
+
 def provision_slice(slice_name="cloud_gaming_experiment"):
-    fablib = fablib_manager()
+    fablib = get_fablib()
     
     try:
         slice = fablib.get_slice(name=slice_name)
+    except Exception as e:
+        # Anything other than "no such slice" (auth, network) would only
+        # resurface minutes later at submit(), so fail now
+        if not is_slice_not_found(e):
+            raise
+    else:
         print(f"Slice {slice_name} already exists. Deleting...")
         slice.delete()
-        time.sleep(10)
-    except:
-        pass
+        _wait_deleted(fablib, slice_name)
 
     print(f"Creating slice {slice_name}...")
     slice = fablib.new_slice(name=slice_name)
 
-    # Constraints
-    CORES = 2
-    RAM = 10
-    DISK = 10  # Max allowed without VM.NoLimitDisk tag
-    IMAGE = 'default_ubuntu_20'
-    SITE = 'SALT'
-    
-    GPU_MODEL = 'GPU_TeslaT4'
-    GPU_NAME = 'Tesla T4'
-    
     # Node A: Gamer/Sender (GPU)
     print("Adding Gamer A (GPU sender)...")
-    gamer_a = slice.add_node(name='gamer-a', site=SITE, cores=CORES, ram=RAM, disk=DISK, image=IMAGE)
-    gamer_a.add_component(model=GPU_MODEL, name='gpu1')
-    iface_a = gamer_a.add_component(model='NIC_Basic', name='nic1').get_interfaces()[0]
+    iface_a = _add_gpu_node(slice, 'gamer-a')
 
     # Node B: Receiver/Monitor (GPU)
     print("Adding Receiver B (GPU receiver)...")
-    receiver_b = slice.add_node(name='receiver-b', site=SITE, cores=CORES, ram=RAM, disk=DISK, image=IMAGE)
-    receiver_b.add_component(model=GPU_MODEL, name='gpu1')
-    iface_b = receiver_b.add_component(model='NIC_Basic', name='nic1').get_interfaces()[0]
+    iface_b = _add_gpu_node(slice, 'receiver-b')
 
     # Node C: Router/Signaling
     print("Adding Router C...")
-    router_c = slice.add_node(name='router-c', site=SITE, cores=CORES, ram=RAM, disk=DISK, image=IMAGE)
-    iface_c = router_c.add_component(model='NIC_Basic', name='nic1').get_interfaces()[0]
+    iface_c = _add_cpu_node(slice, 'router-c')
 
     # Node D: Attacker
     print("Adding Attacker D...")
-    attacker_d = slice.add_node(name='attacker-d', site=SITE, cores=CORES, ram=RAM, disk=DISK, image=IMAGE)
-    iface_d = attacker_d.add_component(model='NIC_Basic', name='nic1').get_interfaces()[0]
+    iface_d = _add_cpu_node(slice, 'attacker-d')
 
     # L2 Network
     print("Creating L2 Network...")
     net = slice.add_l2network(name='gaming_net', interfaces=[iface_a, iface_b, iface_c, iface_d])
 
-    # Submit
+    # Submit; blocks until every node is up and fablib's post-boot config has run
     print("Submitting slice request...")
     slice.submit()
+    nodes = {n.get_name(): n for n in slice.get_nodes()}
 
-    # Configure Network
-    print("Configuring Network...")
-    iface_a = slice.get_node('gamer-a').get_interface(network_name='gaming_net')
-    iface_a.ip_addr_add(addr='192.168.10.10', subnet=IPv4Network('192.168.10.0/24'))
-    iface_a.ip_link_up()
-
-    iface_b = slice.get_node('receiver-b').get_interface(network_name='gaming_net')
-    iface_b.ip_addr_add(addr='192.168.10.11', subnet=IPv4Network('192.168.10.0/24'))
-    iface_b.ip_link_up()
-
-    iface_c = slice.get_node('router-c').get_interface(network_name='gaming_net')
-    iface_c.ip_addr_add(addr='192.168.10.12', subnet=IPv4Network('192.168.10.0/24'))
-    iface_c.ip_link_up()
-
-    iface_d = slice.get_node('attacker-d').get_interface(network_name='gaming_net')
-    iface_d.ip_addr_add(addr='192.168.10.13', subnet=IPv4Network('192.168.10.0/24'))
-    iface_d.ip_link_up()
+    cfg = [('gamer-a', '192.168.10.10'), ('receiver-b', '192.168.10.11'),
+           ('router-c', '192.168.10.12'), ('attacker-d', '192.168.10.13')]
+    _configure_network(nodes, cfg)
 
     print("Slice provisioning complete.")
     
     # Save details
-    details = {
-        "gamer-a": str(slice.get_node('gamer-a').get_management_ip()),
-        "receiver-b": str(slice.get_node('receiver-b').get_management_ip()),
-        "router-c": str(slice.get_node('router-c').get_management_ip()),
-        "attacker-d": str(slice.get_node('attacker-d').get_management_ip())
-    }
+    details = {name: str(node.get_management_ip()) for name, node in nodes.items() if name in NODE_NAMES}
     
-    with open("slice_details.json", "w") as f:
-        json.dump(details, f)
+    write_json("slice_details.json", details)
+    save_slice_cache(slice_name, details)
 
 if __name__ == "__main__":
     provision_slice()
@@ -0,0 +1,74 @@
+import os
+import time
+import random
+from functools import lru_cache
+try:
+    import orjson
+except ImportError:
+    import json
+    orjson = None
+from fabrictestbed_extensions.fablib.fablib import FablibManager as fablib_manager
+
+fab_dir = os.path.expanduser('~/.fabric')
+os.makedirs(fab_dir, exist_ok=True)
+
+FABRIC_ENV_FILES = (
+    ('FABRIC_TOKEN_LOCATION', 'id_token.json'),
+    ('FABRIC_BASTION_KEY_LOCATION', 'bastion_key'),
+    ('FABRIC_SLICE_PRIVATE_KEY_FILE', 'slice_key'),
+    ('FABRIC_SLICE_PUBLIC_KEY_FILE', 'slice_key.pub'),
+)
+
+def configure_fabric_env():
+    """Point fablib at ~/.fabric credentials unless the caller already set them."""
+    for key, name in FABRIC_ENV_FILES:
+        os.environ.setdefault(key, os.path.join(fab_dir, name))
+
+@lru_cache(maxsize=1)
+def get_fablib():
+    """Shared FablibManager; construction parses config and contacts the orchestrator."""
+    return fablib_manager()
+
+def is_slice_not_found(exc):
+    """fablib raises a bare Exception for missing slices; tell it apart from auth/network errors."""
+    msg = str(exc).lower()
+    return "not found" in msg or "unable to find" in msg
+
+def write_json(path, obj):
+    """Write obj compactly as JSON, via orjson when it is installed."""
+    data = orjson.dumps(obj) if orjson else json.dumps(obj).encode()
+    with open(path, "wb") as f:
+        f.write(data)
+
+def read_json(path):
+    with open(path, "rb") as f:
+        data = f.read()
+    return orjson.loads(data) if orjson else json.loads(data)
+
+SLICE_CACHE = os.path.join(fab_dir, 'slice_cache.json')
+
+def save_slice_cache(slice_name, details):
+    """Persist node management IPs so later runs skip the orchestrator lookup."""
+    cache = {"slice": slice_name, "ts": time.time(), "nodes": details}
+    write_json(SLICE_CACHE, cache)
+    return cache
+
+def load_slice_cache():
+    try:
+        return read_json(SLICE_CACHE)
+    except (OSError, ValueError):
+        return None
+
+def backoff_wait(probe, base=1.0, cap=30.0, max_time=600):
+    """Poll probe() with jittered exponential backoff; True once it succeeds, False on timeout."""
+    delay = base
+    deadline = time.monotonic() + max_time
+    while time.monotonic() < deadline:
+        try:
+            if probe():
+                return True
+        except Exception:
+            pass
+        time.sleep(min(cap, delay) + random.uniform(0, 0.5 * min(cap, delay)))
+        delay *= 2
+    return False
@@ -1,24 +1,82 @@
 import argparse
 import asyncio
 import logging
-import time
-import json
 import threading
+from collections import deque
 import os
+import socket
 import sys
 
 import gi
-import numpy as np
 import fractions
+try:
+    import orjson
+except ImportError:
+    import json
+    orjson = None
 from aiortc import RTCPeerConnection, RTCSessionDescription, VideoStreamTrack, RTCConfiguration, RTCIceServer
 from av import VideoFrame
 
+try:
+    import uvloop
+    uvloop.install()  # libuv loop: cheaper wakeups for the frame pump and RTP sends
+except ImportError:
+    pass
+
 gi.require_version('Gst', '1.0')
 from gi.repository import Gst
 Gst.init(None)
 
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+LOG_LEVEL_NAME = os.environ.get("LOG_LEVEL", "INFO").upper()
+LOG_LEVEL = getattr(logging, LOG_LEVEL_NAME, None)
+logging.basicConfig(level=LOG_LEVEL if isinstance(LOG_LEVEL, int) else logging.INFO,
+                    format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger("gamer_sender")
+if not isinstance(LOG_LEVEL, int):
+    logger.warning(f"Unknown LOG_LEVEL {LOG_LEVEL_NAME!r}; using INFO")
+
+FRAME_INTERVAL_NS = Gst.SECOND // 60
+
+Y_PLANE_SIZE = 1280 * 720
+UV_PLANE_SIZE = Y_PLANE_SIZE // 2
+# Enough for one frame being filled, one queued and one being encoded
+FRAME_RING_SIZE = 3
+# Must match the monitor's StreamReader limit: the SDP answer is a single line
+SIGNALING_LIMIT = 2 ** 20
+
+# Probe the registry once instead of parsing a GPU pipeline just to see it fail
+HAS_NVDEC = Gst.ElementFactory.find("nvh264dec") is not None
+
+# Shared tail: stream format -> leaky queue -> appsink
+SINK_TAIL = (
+    "video/x-raw,format=NV12,width=1280,height=720,framerate=60/1 ! "
+    "queue leaky=downstream max-size-buffers=1 ! "
+    "appsink name=sink emit-signals=False max-buffers=1 drop=True"
+)
+
+# filesrc -> qtdemux -> h264parse -> nvh264dec (NV12 out) -> videoscale -> videorate -> appsink
+GPU_PIPELINE = (
+    "filesrc location={path} ! qtdemux ! h264parse ! nvh264dec ! "
+    "videoscale ! videorate ! " + SINK_TAIL
+)
+
+# CPU Fallback: same explicit demux/parse chain as the GPU path, software decoder
+CPU_PIPELINE = (
+    "filesrc location={path} ! qtdemux ! h264parse ! avdec_h264 ! "
+    "videoconvert ! videoscale ! videorate ! " + SINK_TAIL
+)
+
+TEST_PIPELINE = "videotestsrc pattern=ball ! videoconvert ! videoscale ! videorate ! " + SINK_TAIL
+
+def pin_current_thread():
+    """Pin the calling thread to the last allowed CPU (Linux only, needs 2+ CPUs)."""
+    if not hasattr(os, "sched_setaffinity"):
+        return
+    cpus = sorted(os.sched_getaffinity(0))
+    if len(cpus) > 1:
+        # pid 0 targets the calling thread, not the whole process
+        os.sched_setaffinity(0, {cpus[-1]})
+        logger.info(f"Pump thread pinned to CPU {cpus[-1]}")
 
 class GStreamerVideoTrack(VideoStreamTrack):
     kind = "video"
@@ -29,35 +87,25 @@ class GStreamerVideoTrack(VideoStreamTrack):
         
         if not os.path.exists(filename):
             logger.error(f"FATAL: Video file {filename} NOT FOUND! Falling back to videotestsrc")
-            self.source_str = "videotestsrc pattern=ball"
+            self.gpu_pipeline_str = None
+            self.cpu_pipeline_str = TEST_PIPELINE
         else:
             abs_path = os.path.abspath(filename).replace("\\", "/")
-            # filesrc -> qtdemux -> h264parse -> nvh264dec -> videoconvert -> videoscale -> videorate -> format -> appsink
-            
-            self.gpu_pipeline_str = (
-                f"filesrc location={abs_path} ! qtdemux ! h264parse ! nvh264dec ! "
-                "videoconvert ! videoscale ! videorate ! "
-                "video/x-raw,format=RGB,width=1280,height=720,framerate=60/1 ! "
-                "queue ! "
-                "appsink name=sink emit-signals=False max-buffers=1 drop=True"
-            )
-            
-            # CPU Fallback
-            uri = f"file://{abs_path}"
-            self.cpu_pipeline_str = (
-                f"uridecodebin uri={uri} caps=video/x-raw ! videoconvert ! videoscale ! videorate ! "
-                "video/x-raw,format=RGB,width=1280,height=720,framerate=60/1 ! "
-                "queue ! "
-                "appsink name=sink emit-signals=False max-buffers=1 drop=True"
-            )
+            self.gpu_pipeline_str = GPU_PIPELINE.format(path=abs_path) if HAS_NVDEC else None
+            self.cpu_pipeline_str = CPU_PIPELINE.format(path=abs_path)
 
         # Attempt to launch GPU pipeline first
-        logger.info("Attempting to launch GPU Pipeline...")
-        try:
-            self.pipeline = Gst.parse_launch(self.gpu_pipeline_str)
-            self.using_gpu = True
-        except Exception as e:
-            logger.warning(f"GPU Pipeline failed to construct: {e}. Falling back to CPU.")
+        if self.gpu_pipeline_str:
+            logger.info("Attempting to launch GPU Pipeline...")
+            try:
+                self.pipeline = Gst.parse_launch(self.gpu_pipeline_str)
+                self.using_gpu = True
+            except Exception as e:
+                logger.warning(f"GPU Pipeline failed to construct: {e}. Falling back to CPU.")
+                self.pipeline = Gst.parse_launch(self.cpu_pipeline_str)
+                self.using_gpu = False
+        else:
+            logger.info("nvh264dec not registered. Using CPU Pipeline.")
             self.pipeline = Gst.parse_launch(self.cpu_pipeline_str)
             self.using_gpu = False
 
@@ -65,8 +113,14 @@ class GStreamerVideoTrack(VideoStreamTrack):
         self.bus = self.pipeline.get_bus()
         
         self.running = True
-        self.current_frame = None
-        self.frame_available = asyncio.Event()
+        # Single-slot handoff, only touched on the event loop thread
+        self.frames = asyncio.Queue(maxsize=1)
+        # Reused output frames. A frame is taken off the free list by the pump
+        # thread and only returned once nothing can still read it: when it is
+        # dropped unsent, or when recv() hands out the next one (aiortc encodes
+        # a frame before asking for another). deque append/popleft are atomic.
+        self._free_frames = deque(VideoFrame(width=1280, height=720, format="nv12") for _ in range(FRAME_RING_SIZE))
+        self._sent_frame = None
         self.pump_thread = threading.Thread(target=self.pump_loop, daemon=True)
         
         ret = self.pipeline.set_state(Gst.State.PLAYING)
@@ -91,22 +145,29 @@ class GStreamerVideoTrack(VideoStreamTrack):
 
     def pump_loop(self):
         logger.info("GStreamer Pump Thread Started")
+        pin_current_thread()
+        # Only EOS/ERROR are acted on; everything else is discarded by the filter
+        bus_mask = Gst.MessageType.EOS | Gst.MessageType.ERROR
         while self.running:
-            # 1. Message Handling
-            msg = self.bus.pop() 
+            if self.pipeline.get_state(0)[1] != Gst.State.PLAYING:
+                # Block on the bus instead of sleeping blind while not playing
+                msg = self.bus.timed_pop_filtered(100 * Gst.MSECOND, bus_mask)
+                if msg:
+                    self.handle_message(msg)
+                continue
+
+            # 1. Message Handling (non-blocking)
+            msg = self.bus.timed_pop_filtered(0, bus_mask)
             if msg:
                 self.handle_message(msg)
 
-            # 2. Sample Pulling
+            # 2. Sample Pulling (wait up to one frame interval so the loop wakes per frame)
             try:
-                sample = self.sink.emit("try-pull-sample", 5000000) 
+                sample = self.sink.emit("try-pull-sample", FRAME_INTERVAL_NS)
                 if sample:
                    self.process_sample(sample)
             except Exception as e:
                 logger.warning(f"Pull error: {e}")
-            
-            if not self.pipeline.get_state(0)[1] == Gst.State.PLAYING:
-                 time.sleep(0.1)
 
     def handle_message(self, message):
         t = message.type
@@ -126,32 +187,43 @@ class GStreamerVideoTrack(VideoStreamTrack):
         if not success: return
 
         try:
-            array = np.ndarray(
-                shape=(720, 1280, 3),
-                dtype=np.uint8,
-                buffer=map_info.data
-            )
-            frame = VideoFrame.from_ndarray(array, format="rgb24")
-            self.current_frame = frame
-            self._loop.call_soon_threadsafe(self.frame_available.set)
+            # NV12: full-res Y plane followed by interleaved half-res UV rows
+            data = memoryview(map_info.data)
+            try:
+                frame = self._free_frames.popleft()
+            except IndexError:
+                # Encoder is behind and every frame is spoken for: drop this sample
+                return
+            frame.planes[0].update(data[:Y_PLANE_SIZE])
+            frame.planes[1].update(data[Y_PLANE_SIZE:Y_PLANE_SIZE + UV_PLANE_SIZE])
+            self._loop.call_soon_threadsafe(self._publish_frame, frame)
             
             if not hasattr(self, "_fc"): self._fc = 0
             self._fc += 1
-            if self._fc % 60 == 0: logger.info(f"DEBUG: Produced frame {self._fc}")
+            if self._fc % 60 == 0: logger.debug("Produced frame %d", self._fc)
 
         except Exception as e:
             logger.error(f"Frame creation error: {e}")
         finally:
             buffer.unmap(map_info)
 
+    def _publish_frame(self, frame):
+        # Drop the oldest frame if recv() hasn't taken it yet
+        if self.frames.full():
+            self._free_frames.append(self.frames.get_nowait())
+        self.frames.put_nowait(frame)
+
     async def recv(self):
         # Wait for GStreamer to produce a frame (sync to 60fps)
-        await self.frame_available.wait()
-        self.frame_available.clear()
+        frame = await self.frames.get()
+        # The previous frame has been encoded by now, so its buffers can be refilled
+        if self._sent_frame is not None:
+            self._free_frames.append(self._sent_frame)
+        self._sent_frame = frame
         
         if not hasattr(self, "_rc"): self._rc = 0
         self._rc += 1
-        if self._rc % 60 == 0: logger.info(f"DEBUG: Recv frame {self._rc}")
+        if self._rc % 60 == 0: logger.debug("Recv frame %d", self._rc)
 
         # 60FPS Pacing (1/60 * 90000 = 1500)
         pts_step = 1500
@@ -159,8 +231,6 @@ class GStreamerVideoTrack(VideoStreamTrack):
         else: self._pts += pts_step
         pts = self._pts
         
-        frame = self.current_frame
-        
         frame.pts = int(pts)
         frame.time_base = fractions.Fraction(1, 90000)
         return frame
@@ -171,13 +241,22 @@ class GStreamerVideoTrack(VideoStreamTrack):
         if self.pump_thread.is_alive():
             self.pump_thread.join(timeout=1.0)
 
-async def run(pc, signaling_ip, signaling_port):
+def tune_signaling_socket(writer):
+    """Disable Nagle and enable keepalive so small SDP writes ship immediately."""
+    sock = writer.get_extra_info('socket')
+    if sock is None:
+        return
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+
+async def run(pc, signaling_ip, signaling_port, debug=False):
     logger.info(f"Connecting to {signaling_ip}:{signaling_port}")
     try:
-        reader, writer = await asyncio.open_connection(signaling_ip, signaling_port)
+        reader, writer = await asyncio.open_connection(signaling_ip, signaling_port, limit=SIGNALING_LIMIT)
     except OSError as e:
         logger.error(f"Failed to connect signaling: {e}")
         return
+    tune_signaling_socket(writer)
 
     logger.info("Initializing GStreamer Track...")
     try:
@@ -193,15 +272,16 @@ async def run(pc, signaling_ip, signaling_port):
     filtered_lines = [line for line in sdp_lines if "10.30." not in line]
     final_sdp = "\r\n".join(filtered_lines) + "\r\n"
 
-    payload = json.dumps({"sdp": final_sdp, "type": pc.localDescription.type})
-    writer.write(payload.encode() + b"\n")
+    message = {"sdp": final_sdp, "type": pc.localDescription.type}
+    payload = orjson.dumps(message) if orjson else json.dumps(message).encode()
+    writer.write(payload + b"\n")
     await writer.drain()
 
     data = await reader.readline()
     if not data:
         return
         
-    answer_json = json.loads(data.decode())
+    answer_json = orjson.loads(data) if orjson else json.loads(data)
     
     # Filter Remote Candidates (Answer)
     if "sdp" in answer_json:
@@ -211,8 +291,12 @@ async def run(pc, signaling_ip, signaling_port):
 
     await pc.setRemoteDescription(RTCSessionDescription(sdp=answer_json["sdp"], type=answer_json["type"]))
     
-    logger.info("Streaming Started. Checking NV-SMI...")
-    os.system("nvidia-smi") # Check if GPU is visible
+    logger.info("Streaming Started.")
+    if debug:
+        # Check if GPU is visible, without forking a shell on the event loop
+        proc = await asyncio.create_subprocess_exec("nvidia-smi", stdout=asyncio.subprocess.PIPE)
+        out, _ = await proc.communicate()
+        logger.info(out.decode())
 
     try:
         while True:
@@ -230,12 +314,12 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("--receiver-ip", required=True)
     parser.add_argument("--port", type=int, default=8888)
+    parser.add_argument("--debug", action="store_true", help="Log nvidia-smi output once streaming starts")
     args = parser.parse_args()
 
     pconfig = RTCIceServer(urls=["stun:stun.l.google.com:19302"])
     pc = RTCPeerConnection(configuration=RTCConfiguration(iceServers=[pconfig]))
-    loop = asyncio.get_event_loop()
     try:
-        loop.run_until_complete(run(pc, args.receiver_ip, args.port))
+        asyncio.run(run(pc, args.receiver_ip, args.port, args.debug))
     except KeyboardInterrupt:
         pass
@@ -1,94 +1,144 @@
 import argparse
 import asyncio
 import logging
-import json
 import time
 import os
+import socket
 import csv
-import cv2
-from aiortc import RTCPeerConnection, RTCSessionDescription, MediaStreamTrack, RTCConfiguration, RTCIceServer
-from aiortc.contrib.media import MediaBlackhole, MediaPlayer, MediaRecorder
+try:
+    import orjson
+except ImportError:
+    import json
+    orjson = None
+from aiortc import RTCPeerConnection, RTCSessionDescription, RTCConfiguration, RTCIceServer
+
+try:
+    import uvloop
+    uvloop.install()  # libuv loop: tighter asyncio.sleep wakeups for the 1s bitrate window
+except ImportError:
+    pass
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger("monitor_receiver")
 
+CSV_FIELDS = ('timestamp', 'fps', 'stall_duration_ms', 'bitrate_mbps', 'packets_lost', 'rx_bytes')
+STALL_THRESHOLD_NS = 200_000_000
+# SDP travels as one JSON line; the 64 KiB StreamReader default is too tight
+# once candidate lists grow
+SIGNALING_LIMIT = 2 ** 20
+
 class MetricsRecorder:
-    def __init__(self, filename):
+    def __init__(self, filename, iface=None):
         self.filename = filename
-        self.start_time = time.time()
+        # Kernel RX counter of the data NIC, sampled locally each tick so the
+        # orchestrator needn't read it over SSH
+        self._rx_path = f"/sys/class/net/{iface}/statistics/rx_bytes" if iface else None
+        # Monotonic integer nanoseconds: immune to NTP steps, exact deltas
+        self.start_ns = time.monotonic_ns()
         self.frames_received = 0
         self.bytes_received = 0
         self.last_bytes_received = 0
-        self.last_frame_time = None
+        self.last_packets_lost = 0
+        self.last_frame_ns = None
         self.stalls = 0
-        self.total_stall_duration = 0.0
+        self.total_stall_ns = 0
         self.fps_history = []
         self.loss_history = []
         self.started = False # Lazy start flag
+        self._rtp_key = None # Id of the video inbound-rtp report that last yielded bytesReceived
         
         # CSV init
         abs_path = os.path.abspath(self.filename)
         logger.info(f"Initializing MetricsRecorder. Writing to: {abs_path}")
-        with open(self.filename, 'w', newline='') as f:
-            writer = csv.DictWriter(f, fieldnames=['timestamp', 'fps', 'stall_duration_ms', 'bitrate_mbps'])
-            writer.writeheader()
+        # Opened once and line-buffered so each 1s row reaches disk without a reopen
+        self._f = open(self.filename, 'w', newline='', buffering=1)
+        self._writer = csv.writer(self._f)
+        self._writer.writerow(CSV_FIELDS)
+
+    def read_rx_bytes(self):
+        if self._rx_path is None:
+            return ''
+        try:
+            with open(self._rx_path) as f:
+                return int(f.read())
+        except (OSError, ValueError):
+            return ''
 
     def update(self):
-        now = time.time()
+        now = time.monotonic_ns()
         
         if not self.started:
             self.started = True
             logger.info("First frame received. Starting metrics recording.")
             
-        if self.last_frame_time is None:
-            self.last_frame_time = now
+        if self.last_frame_ns is None:
+            self.last_frame_ns = now
             return
 
-        inter_frame_time = now - self.last_frame_time
+        inter_frame_ns = now - self.last_frame_ns
         self.frames_received += 1
         
         # Stall detection (> 200ms freeze)
-        if inter_frame_time > 0.2:
+        if inter_frame_ns > STALL_THRESHOLD_NS:
             self.stalls += 1
-            self.total_stall_duration += inter_frame_time
+            self.total_stall_ns += inter_frame_ns
             
-        self.last_frame_time = now
+        self.last_frame_ns = now
+
+    def close(self):
+        self._f.close()
 
     async def log_periodically(self, pc):
         while True:
             await asyncio.sleep(1.0) # Log every second
             
-            if not self.started or self.last_frame_time is None:
+            if not self.started or self.last_frame_ns is None:
                 continue
 
-            now = time.time()
+            now = time.monotonic_ns()
             
             # Check for active stall (frozen stream)
             # If we haven't received a frame in > 200ms, count it as stall time NOW
-            time_since_last = now - self.last_frame_time
-            if time_since_last > 0.2:
+            ns_since_last = now - self.last_frame_ns
+            if ns_since_last > STALL_THRESHOLD_NS:
                 self.stalls += 1
-                self.total_stall_duration += time_since_last
-                # Forward the last_frame_time so we don't double count this duration
+                self.total_stall_ns += ns_since_last
+                # Forward the last_frame_ns so we don't double count this duration
                 # when/if the next frame finally arrives.
-                self.last_frame_time = now
+                self.last_frame_ns = now
 
             fps = self.frames_received
             
             # Get Bitrate from WebRTC Stats
             current_bytes = 0
             stats = await pc.getStats()
-            
+
+            # Fast path: report ids are stable, so reuse the inbound-rtp one that last had bytes
+            rtp = stats.get(self._rtp_key) if self._rtp_key is not None else None
+            if rtp is not None:
+                current_bytes = getattr(rtp, 'bytesReceived', 0)
+
             # Strategy 1: Try inbound-rtp (Standard)
-            for key, report in stats.items():
-                if report.type == 'inbound-rtp' and report.kind == 'video':
-                    b = getattr(report, 'bytesReceived', 0)
-                    if b > 0:
-                        current_bytes = b
-                        break
+            if current_bytes == 0:
+                for key, report in stats.items():
+                    if report.type == 'inbound-rtp' and report.kind == 'video':
+                        rtp = report
+                        b = getattr(report, 'bytesReceived', 0)
+                        if b > 0:
+                            current_bytes = b
+                            self._rtp_key = key
+                            break
 
-            # Strategy 2: If 0, try transport stats (Aggregate for connection)
+            # Cumulative RTP loss from the jitter buffer's point of view; lets
+            # stalls be attributed to network loss rather than decode/scheduling gaps
+            packets_lost = (getattr(rtp, 'packetsLost', 0) or 0) if rtp is not None else 0
+            lost = max(packets_lost - self.last_packets_lost, 0)
+            self.last_packets_lost = packets_lost
+            self.loss_history.append(lost)
+
+            # Strategy 2: If 0, try transport stats (Aggregate for connection).
+            # Not cached, so inbound-rtp is preferred again as soon as it has bytes
             if current_bytes == 0:
                 for key, report in stats.items():
                      if report.type == 'transport':
@@ -129,27 +179,30 @@ class MetricsRecorder:
             self.bytes_received = 0
                         
             # Log to CSV
-            with open(self.filename, 'a', newline='') as f:
-                writer = csv.DictWriter(f, fieldnames=['timestamp', 'fps', 'stall_duration_ms', 'bitrate_mbps'])
-                writer.writerow({
-                    'timestamp': now - self.start_time,
-                    'fps': fps,
-                    'stall_duration_ms': self.total_stall_duration * 1000,
-                    'bitrate_mbps': bitrate
-                })
+            stall_ms = self.total_stall_ns / 1e6
+            self._writer.writerow(((now - self.start_ns) / 1e9, fps, stall_ms, bitrate, lost, self.read_rx_bytes()))
             
-            logger.info(f"Stats: FPS={fps}, Stalls={self.stalls}, Total Stall Time={self.total_stall_duration*1000:.1f}ms")
-            self.total_stall_duration = 0 
+            logger.info(f"Stats: FPS={fps}, Stalls={self.stalls}, Total Stall Time={stall_ms:.1f}ms, Lost={lost}")
+            self.total_stall_ns = 0
             self.stalls = 0
 
+def tune_signaling_socket(writer):
+    """Disable Nagle and enable keepalive so small SDP writes ship immediately."""
+    sock = writer.get_extra_info('socket')
+    if sock is None:
+        return
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+
 async def handle_client(reader, writer, pc, metrics):
     logger.info("Signaling connection accepted")
+    tune_signaling_socket(writer)
     
     # Receive Offer
     data = await reader.readline()
     if not data:
         return
-    offer_json = json.loads(data.decode())
+    offer_json = orjson.loads(data) if orjson else json.loads(data)
     # Filter Remote Candidates (Offer)
     if "sdp" in offer_json:
         sdp_lines = offer_json["sdp"].splitlines()
@@ -170,17 +223,26 @@ async def handle_client(reader, writer, pc, metrics):
     filtered_lines = [line for line in sdp_lines if "10.30." not in line]
     final_sdp = "\r\n".join(filtered_lines) + "\r\n"
 
-    payload = json.dumps({"sdp": final_sdp, "type": pc.localDescription.type})
-    writer.write(payload.encode() + b"\n")
+    message = {"sdp": final_sdp, "type": pc.localDescription.type}
+    payload = orjson.dumps(message) if orjson else json.dumps(message).encode()
+    writer.write(payload + b"\n")
     await writer.drain()
     
     logger.info("Sent Answer. Waiting for track...")
 
-    # Wait until connection closes
+    # Hold the signaling socket while the peer connection lives; the bounded
+    # read notices a crashed peer instead of parking on EOF forever
     try:
-        await reader.read()
-    except:
+        while pc.connectionState not in ('failed', 'closed', 'disconnected'):
+            try:
+                if not await asyncio.wait_for(reader.readline(), timeout=5.0):
+                    break
+            except asyncio.TimeoutError:
+                continue
+    except (OSError, ValueError):  # ValueError: readline() overran the stream limit
         pass
+    finally:
+        writer.close()
 
 def run_server(ip, port, metrics):
     pconfig = RTCIceServer(urls=["stun:stun.l.google.com:19302"])
@@ -191,14 +253,10 @@ def run_server(ip, port, metrics):
         logger.info(f"Track received: {track.kind} (ID: {track.id})")
         if track.kind == "video":
             async def consume():
-                frame_count = 0
                 logger.info("Starting video track consumer loop...")
                 while True:
                     try:
-                        frame = await track.recv()
-                        frame_count += 1
-                        if frame_count % 60 == 0:
-                            logger.info(f"DEBUG: Frame received {frame_count} (pts={frame.pts})")
+                        await track.recv()
                         metrics.update()
                     except Exception as e:
                         logger.warning(f"Track ended or Error in consume: {e}")
@@ -212,7 +270,7 @@ def run_server(ip, port, metrics):
     # TCP Server for Signaling
     server_coro = asyncio.start_server(
         lambda r, w: handle_client(r, w, pc, metrics), 
-        ip, port
+        ip, port, limit=SIGNALING_LIMIT
     )
     return server_coro, pc
 
@@ -221,11 +279,13 @@ if __name__ == "__main__":
     parser.add_argument("--port", type=int, default=8888, help="Signaling port")
     parser.add_argument("--output", default="gaming_metrics.csv", help="Output CSV file")
     parser.add_argument("--local-ip", default="0.0.0.0", help="Local IP to bind to")
+    parser.add_argument("--iface", default=None, help="Data interface whose rx_bytes is logged per row")
     args = parser.parse_args()
 
-    metrics = MetricsRecorder(args.output)
+    metrics = MetricsRecorder(args.output, iface=args.iface)
     
-    loop = asyncio.get_event_loop()
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
     server_coro, pc = run_server(args.local_ip, args.port, metrics)
     server = loop.run_until_complete(server_coro)
     
@@ -239,3 +299,4 @@ if __name__ == "__main__":
         server.close()
         loop.run_until_complete(server.wait_closed())
         loop.run_until_complete(pc.close())
+        metrics.close()
@@ -1,166 +1,190 @@
 import pandas as pd
+import matplotlib
+matplotlib.use('Agg')  # headless: workers render straight to PNG
 import matplotlib.pyplot as plt
 import glob
 import os
 import re
-import pandas as pd
-import matplotlib.pyplot as plt
-import glob
-import os
-import re
-import math
 import numpy as np
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
+
+# Let Agg merge near-collinear segments before rasterising long series
+plt.rcParams.update({
+    'path.simplify': True,
+    'path.simplify_threshold': 1.0,
+    'agg.path.chunksize': 10000,
+})
+
+# ping -D line: [1234.56] 64 bytes from ... time=12.3 ms
+_PING_RE = re.compile(rb'\[(\d+\.\d+)\][^\n]*?time=([\d.]+)')
+_PING_DTYPE = [('time', 'f8'), ('rtt', 'f8')]
+_CDF_GRID = np.linspace(0.0, 1.0, 1024)
+# metrics_<phase>.csv / ping_<phase>.log
+_PHASE_RE = re.compile(r'^(?:metrics|ping)_(.*?)\.(?:csv|log)$')
 
 def parse_ping_log(filename):
     """Parses ping output: [timestamp] 64 bytes from ... time=X ms"""
-    timestamps = []
-    rtts = []
-    with open(filename, 'r') as f:
-        for line in f:
-            # Match: [1234.56] ... time=12.3 ms
-            match = re.search(r'\[(\d+\.\d+)\]', line)
-            time_match = re.search(r'time=([\d\.]+)', line)
-            if match and time_match:
-                timestamps.append(float(match.group(1)))
-                rtts.append(float(time_match.group(1)))
-    
-    if not timestamps:
+    # One findall over the raw bytes (no text decode or line splitting),
+    # converted straight into float columns
+    with open(filename, 'rb') as f:
+        arr = np.fromregex(f, _PING_RE, dtype=_PING_DTYPE)
+    if arr.size == 0:
         return pd.DataFrame()
     
     # Normalize time start to 0
-    start = timestamps[0]
-    timestamps = [t - start for t in timestamps]
-    return pd.DataFrame({'time': timestamps, 'rtt': rtts})
+    t = arr['time']
+    t -= t[0]
+    return pd.DataFrame({'time': t, 'rtt': arr['rtt']})
 
-def plot_fps_series():
-    plt.figure(figsize=(10, 5))
-    
-    files = glob.glob("metrics_*.csv")
-    for f in files:
-        phase = f.replace("metrics_", "").replace(".csv", "")
+# Known columns of the per-phase metrics_*.csv and the gaming_metrics.csv summary;
+# declaring them skips pandas' type sniffing
+_CSV_DTYPES = {
+    'timestamp': 'f8', 'fps': 'f4', 'stall_duration_ms': 'f8', 'bitrate_mbps': 'f8',
+    'packets_lost': 'f8', 'rx_bytes': 'f8',
+    'phase': 'str', 'avg_fps': 'f8', 'total_stall_ms': 'f8', 'game_mbps': 'f8',
+    'attack_mbps': 'f8', 'j_index': 'f8',
+}
+
+@lru_cache(maxsize=None)
+def _load_csv(path, mtime):
+    """pd.read_csv memoised on (path, mtime); callers must not mutate the result."""
+    return pd.read_csv(path, dtype=_CSV_DTYPES, engine='c')
+
+def read_csv_cached(path):
+    return _load_csv(path, os.path.getmtime(path))
+
+def load_phase_metrics():
+    """Read every metrics_<phase>.csv up front into a {phase: DataFrame} dict."""
+    frames = {}
+    for f in glob.glob("metrics_*.csv"):
         try:
-            df = pd.read_csv(f)
-            plt.plot(df['timestamp'], df['fps'], label=phase)
+            frames[_PHASE_RE.match(os.path.basename(f)).group(1)] = read_csv_cached(f)
         except Exception as e:
             print(f"Skipping {f}: {e}")
+    return frames
+
+def plot_fps_series():
+    fig, ax = plt.subplots(figsize=(10, 5))
+    
+    for phase, df in load_phase_metrics().items():
+        ax.plot(df['timestamp'].to_numpy(), df['fps'].to_numpy(), label=phase)
             
-    plt.title("Gaming FPS over Time")
-    plt.xlabel("Time (s)")
-    plt.ylabel("FPS")
-    plt.legend()
-    plt.grid(True)
-    plt.savefig("chart_fps_series.png")
+    ax.set_title("Gaming FPS over Time")
+    ax.set_xlabel("Time (s)")
+    ax.set_ylabel("FPS")
+    ax.legend()
+    ax.grid(True)
+    fig.savefig("chart_fps_series.png")
     print("Saved chart_fps_series.png")
+    plt.close(fig)
 
 def plot_rtt_cdf():
-    plt.figure(figsize=(10, 5))
+    fig, ax = plt.subplots(figsize=(10, 5))
     
     files = glob.glob("ping_*.log")
     for f in files:
-        phase = f.replace("ping_", "").replace(".log", "")
+        phase = _PHASE_RE.match(os.path.basename(f)).group(1)
         df = parse_ping_log(f)
         if df.empty: continue
         
-        sorted_rtt = df['rtt'].sort_values()
-        yvals = list(range(len(sorted_rtt)))
-        yvals = [y/len(sorted_rtt) for y in yvals]
+        # A fixed quantile grid keeps the path at 1024 vertices however long the log
+        xs = np.quantile(df['rtt'].to_numpy(), _CDF_GRID)
         
-        plt.plot(sorted_rtt, yvals, label=phase)
+        ax.plot(xs, _CDF_GRID, label=phase)
         
-    plt.title("RTT CDF (Latency Distribution)")
-    plt.xlabel("RTT (ms)")
-    plt.ylabel("CDF")
-    plt.legend()
-    plt.grid(True)
-    plt.savefig("chart_rtt_cdf.png")
+    ax.set_title("RTT CDF (Latency Distribution)")
+    ax.set_xlabel("RTT (ms)")
+    ax.set_ylabel("CDF")
+    ax.legend()
+    ax.grid(True)
+    fig.savefig("chart_rtt_cdf.png")
     print("Saved chart_rtt_cdf.png")
+    plt.close(fig)
 
 def plot_rtt_series():
-    plt.figure(figsize=(10, 5))
+    fig, ax = plt.subplots(figsize=(10, 5))
     
     files = glob.glob("ping_*.log")
     for f in files:
-        phase = f.replace("ping_", "").replace(".log", "")
+        phase = _PHASE_RE.match(os.path.basename(f)).group(1)
         df = parse_ping_log(f)
         if df.empty: continue
         
-        plt.plot(df['time'], df['rtt'], label=phase, alpha=0.7)
+        ax.plot(df['time'], df['rtt'], label=phase, alpha=0.7)
         
-    plt.title("RTT (Latency) over Time")
-    plt.xlabel("Time (s)")
-    plt.ylabel("RTT (ms)")
-    plt.legend()
-    plt.grid(True)
-    plt.savefig("chart_rtt_series.png")
+    ax.set_title("RTT (Latency) over Time")
+    ax.set_xlabel("Time (s)")
+    ax.set_ylabel("RTT (ms)")
+    ax.legend()
+    ax.grid(True)
+    fig.savefig("chart_rtt_series.png")
     print("Saved chart_rtt_series.png")
+    plt.close(fig)
 
 def plot_bitrate_series():
-    plt.figure(figsize=(10, 5))
+    fig, ax = plt.subplots(figsize=(10, 5))
     
-    files = glob.glob("metrics_*.csv")
     has_data = False
-    for f in files:
-        phase = f.replace("metrics_", "").replace(".csv", "")
-        try:
-            df = pd.read_csv(f)
-            if 'bitrate_mbps' in df.columns:
-                plt.plot(df['timestamp'], df['bitrate_mbps'], label=phase, linewidth=2)
-                has_data = True
-        except Exception as e:
-            print(f"Skipping {f}: {e}")
+    for phase, df in load_phase_metrics().items():
+        if 'bitrate_mbps' in df.columns:
+            ax.plot(df['timestamp'].to_numpy(), df['bitrate_mbps'].to_numpy(), label=phase, linewidth=2)
+            has_data = True
             
     if has_data:
-        # plt.axhline(y=40, color='r', linestyle='--', label='Link Capacity (40Mbps)') # Omitted to zoom in
-        plt.title("Game Throughput over Time")
-        plt.xlabel("Time (s)")
-        plt.ylabel("Throughput (Mbps)")
-        plt.legend()
-        plt.grid(True)
-        plt.savefig("chart_bitrate_series.png")
+        # ax.axhline(y=40, color='r', linestyle='--', label='Link Capacity (40Mbps)') # Omitted to zoom in
+        ax.set_title("Game Throughput over Time")
+        ax.set_xlabel("Time (s)")
+        ax.set_ylabel("Throughput (Mbps)")
+        ax.legend()
+        ax.grid(True)
+        fig.savefig("chart_bitrate_series.png")
         print("Saved chart_bitrate_series.png")
     else:
         print("No bitrate data found in metrics CSVs (Requires new monitor_webrtc.py)")
+    plt.close(fig)
 
 def plot_harm_factor():
     if not os.path.exists("gaming_metrics.csv"):
         print("No summary metrics found.")
         return
 
-    df = pd.read_csv("gaming_metrics.csv")
+    df = read_csv_cached("gaming_metrics.csv")
     baseline = df[df['phase'] == 'baseline']
     if baseline.empty: return
     
     base_stall = baseline.iloc[0]['total_stall_ms']
     
-    phases = []
-    harms = []
-    
-    for index, row in df.iterrows():
-        if row['phase'] == 'baseline': continue
-        
-        phases.append(row['phase'])
-        if base_stall > 0:
-            harm = row['total_stall_ms'] / base_stall
-        else:
-            harm = 0 if row['total_stall_ms'] == 0 else 999
-            
-        harms.append(harm)
+    others = df[df['phase'] != 'baseline']
+    stall = others['total_stall_ms'].to_numpy(dtype=np.float64)
+    phases = others['phase'].tolist()
+    if base_stall > 0:
+        harms = (stall / base_stall).tolist()
+    else:
+        harms = np.where(stall == 0, 0, 999).tolist()
         
-    plt.figure(figsize=(8, 6))
-    bars = plt.bar(phases, harms, color=['orange', 'red'])
+    fig, ax = plt.subplots(figsize=(8, 6))
+    bars = ax.bar(phases, harms, color=['orange', 'red'])
     
-    plt.title("Harm Factor (Relative to Baseline)")
-    plt.ylabel("Harm Factor (x times slower)")
-    plt.axhline(y=1.0, color='gray', linestyle='--')
+    ax.set_title("Harm Factor (Relative to Baseline)")
+    ax.set_ylabel("Harm Factor (x times slower)")
+    ax.axhline(y=1.0, color='gray', linestyle='--')
     
     for bar in bars:
         height = bar.get_height()
-        plt.text(bar.get_x() + bar.get_width()/2., height,
+        ax.text(bar.get_x() + bar.get_width()/2., height,
                 f'{height:.1f}x',
                 ha='center', va='bottom')
                 
-    plt.savefig("chart_harm_factor.png")
+    fig.tight_layout()
+    fig.savefig("chart_harm_factor.png")
     print("Saved chart_harm_factor.png")
+    plt.close(fig)
+
+def _style_axis(ax, label, color):
+    """Label a y-axis and tint its ticks to match the series drawn on it."""
+    ax.set_ylabel(label, color=color)
+    ax.tick_params(axis='y', labelcolor=color)
 
 def plot_summary_metrics():
     if not os.path.exists("gaming_metrics.csv"):
@@ -168,27 +192,25 @@ def plot_summary_metrics():
         return
 
     try:
-        df = pd.read_csv('gaming_metrics.csv')
+        df = read_csv_cached('gaming_metrics.csv')
         
         fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(15, 6))
 
         # Plot 1: FPS and Stalls
-        phases = df['phase']
+        phases = df['phase'].to_numpy()
         x = np.arange(len(phases))
         width = 0.6 
         
         # FPS Bar (Primary Y-axis)
-        fps = df['avg_fps']
+        fps = df['avg_fps'].to_numpy()
         ax1.bar(x, fps, width=width, color='skyblue', alpha=0.8, label='Avg FPS')
-        ax1.set_ylabel('Avg FPS', color='blue')
-        ax1.tick_params(axis='y', labelcolor='blue')
+        _style_axis(ax1, 'Avg FPS', 'blue')
         
         # Stall Duration Line (Secondary Y-axis)
-        stalls = df['total_stall_ms'] / 1000.0 # Convert ms to seconds
+        stalls = df['total_stall_ms'].to_numpy() / 1000.0 # Convert ms to seconds
         ax1b = ax1.twinx()
         ax1b.plot(x, stalls, color='red', marker='o', linewidth=3, markersize=8, label='Total Stall Time (s)')
-        ax1b.set_ylabel('Total Stall Time (s)', color='red')
-        ax1b.tick_params(axis='y', labelcolor='red')
+        _style_axis(ax1b, 'Total Stall Time (s)', 'red')
         
         ax1.set_title('Gaming Quality: FPS vs Stalls')
         ax1.set_xticks(x)
@@ -197,20 +219,19 @@ def plot_summary_metrics():
 
         # Plot Throughput & Fairness
         if 'attack_mbps' in df.columns and 'j_index' in df.columns:
-            attack_rate = df['attack_mbps']
-            j_index = df['j_index']
+            attack_rate = df['attack_mbps'].to_numpy()
+            j_index = df['j_index'].to_numpy()
 
             # Attack Throughput (Bars)
             ax2.bar(x, attack_rate, width=width, color='orange', alpha=0.7, label='BBRv3 Attack Throughput')
             ax2.axhline(y=40.0, color='gray', linestyle='--', linewidth=1, label='Link Capacity (40Mbps)')
             
             # Annotate bars with Jain Index
-            for i, j in enumerate(j_index):
-                if not math.isnan(j):
-                    ax2.text(x[i], attack_rate[i] + 1, f"J={j:.2f}", ha='center', fontsize=10, fontweight='bold', color='purple')
+            has_j = ~np.isnan(j_index)
+            for xi, a, j in zip(x[has_j], attack_rate[has_j], j_index[has_j]):
+                ax2.text(xi, a + 1, f"J={j:.2f}", ha='center', fontsize=10, fontweight='bold', color='purple')
             
-            ax2.set_ylabel('Attack Throughput (Mbps)', color='orange')
-            ax2.tick_params(axis='y', labelcolor='orange')
+            _style_axis(ax2, 'Attack Throughput (Mbps)', 'orange')
             ax2.set_title('Attack Saturation vs. Fairness')
             ax2.set_xticks(x)
             ax2.set_xticklabels(phases, rotation=15)
@@ -220,24 +241,32 @@ def plot_summary_metrics():
             ax2b = ax2.twinx()
             ax2b.plot(x, j_index, color='purple', marker='s', linewidth=2, label="Jain's Index")
             ax2b.set_ylim(0, 1.2)
-            ax2b.set_ylabel('Fairness Index (1.0=Fair)', color='purple')
-            ax2b.tick_params(axis='y', labelcolor='purple')
+            _style_axis(ax2b, 'Fairness Index (1.0=Fair)', 'purple')
             
-        plt.tight_layout()
-        plt.savefig('chart_summary_metrics.png')
+        fig.tight_layout()
+        fig.savefig('chart_summary_metrics.png')
         print("Saved chart_summary_metrics.png")
+        plt.close(fig)
     except Exception as e:
         print(f"Summary Graph generation failed: {e}")
 
+# Charts that read the same inputs share a worker so its CSV cache is reused
+PLOT_GROUPS = (
+    (plot_fps_series, plot_bitrate_series),
+    (plot_rtt_cdf, plot_rtt_series),
+    (plot_harm_factor, plot_summary_metrics),
+)
+
+def _run_group(fns):
+    for fn in fns:
+        fn()
+
 if __name__ == "__main__":
     print("Generating Plots...")
     try:
-        plot_fps_series()
-        plot_rtt_cdf()
-        plot_rtt_series()
-        plot_bitrate_series()
-        plot_harm_factor()
-        plot_summary_metrics()
+        with ProcessPoolExecutor(max_workers=len(PLOT_GROUPS)) as ex:
+            for _ in ex.map(_run_group, PLOT_GROUPS):
+                pass
         print("Done.")
     except Exception as e:
         print(f"Error plotting: {e}")
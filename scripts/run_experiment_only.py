@@ -4,85 +4,194 @@ import sys
 import time
 import json
 import csv
+import io
+import tarfile
+import tempfile
 import logging
 import math
-from fabrictestbed_extensions.fablib.fablib import FablibManager as fablib_manager
+import shlex
+import urllib.request
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from fabric_common import configure_fabric_env, get_fablib, load_slice_cache, backoff_wait
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-fab_dir = os.path.expanduser('~/.fabric')
-os.environ['FABRIC_TOKEN_LOCATION'] = os.path.join(fab_dir, 'id_token.json')
-os.environ['FABRIC_BASTION_KEY_LOCATION'] = os.path.join(fab_dir, 'bastion_key')
-os.environ['FABRIC_SLICE_PRIVATE_KEY_FILE'] = os.path.join(fab_dir, 'slice_key')
-os.environ['FABRIC_SLICE_PUBLIC_KEY_FILE'] = os.path.join(fab_dir, 'slice_key.pub')
+configure_fabric_env()
+
+NODE_NAMES = ('gamer-a', 'receiver-b', 'router-c', 'attacker-d')
+
+# Data-plane NIC names per node; they don't change between phases
+_iface_cache = {}
 
 def get_data_interfaces(node):
+    name = node.get_name()
+    if name in _iface_cache:
+        return _iface_cache[name]
     stdout, _ = node.execute("ls /sys/class/net/", quiet=True)
     if not stdout: return []
-    return [i for i in stdout.strip().split() 
-            if i != 'lo' and 'enp3s' not in i and 'eth0' not in i]
-
-def configure_routed_network(slice):
+    ifaces = [i for i in stdout.strip().split() 
+              if i != 'lo' and 'enp3s' not in i and 'eth0' not in i]
+    if ifaces:
+        _iface_cache[name] = ifaces
+    return ifaces
+
+def get_boot_id(node):
+    """Kernel boot UUID; changes on every boot, so it tells a finished reboot from a pending one."""
+    return node.execute("cat /proc/sys/kernel/random/boot_id", quiet=True, retry=1)[0].strip()
+
+def reboot_and_wait(node, timeout=300):
+    """Reboot node and return once a *new* boot answers over SSH.
+
+    Comparing boot_id rules out both races of a fixed sleep: SSH still up
+    before the node has gone down, and waiting long after it is back.
+    """
+    boot_id = get_boot_id(node)
+    try:
+        node.execute("sudo reboot", quiet=True)
+    except Exception as e:
+        # The session usually drops as the node goes down
+        logger.debug(f"reboot on {node.get_name()} dropped the session: {e}")
+    if not backoff_wait(lambda: get_boot_id(node) not in ("", boot_id), max_time=timeout):
+        logger.warning(f"{node.get_name()} did not come back within {timeout}s")
+        return False
+    return True
+
+def wait_for_port(node, port, timeout=30):
+    """Block until something on node is listening on TCP port; False on timeout."""
+    probe = lambda: "up" in node.execute(f"ss -ltn | grep -q ':{port} ' && echo up", quiet=True)[0]
+    if not backoff_wait(probe, base=0.2, cap=2.0, max_time=timeout):
+        logger.warning(f"Nothing listening on {node.get_name()}:{port} after {timeout}s")
+        return False
+    return True
+
+def download_all(downloads):
+    """Fetch (node, local_path, remote_path) files concurrently; returns the local paths that failed."""
+    def fetch(item):
+        node, local_path, remote_path = item
+        try:
+            node.download_file(local_path, remote_path)
+        except Exception as e:
+            logger.warning(f"Failed to download {remote_path} from {node.get_name()}: {e}")
+            return local_path
+    with ThreadPoolExecutor(max_workers=len(downloads)) as ex:
+        return {p for p in ex.map(fetch, downloads) if p}
+
+# Background experiment processes, each tracked through /tmp/cozard_<name>.pid
+BG_PROCS = ('monitor', 'iperf3_server', 'ping', 'iperf3_client', 'gamer')
+
+def _pidfile(name):
+    return f"/tmp/cozard_{name}.pid"
+
+def start_bg(node, name, cmd):
+    """Launch cmd detached on node and record its PID (exec keeps it the same process)."""
+    node.execute(f"nohup bash -c {shlex.quote('exec ' + cmd)} >/dev/null 2>&1 </dev/null & "
+                 f"echo $! > {_pidfile(name)}", quiet=True)
+
+def stop_bg(node, *names, timeout=5):
+    """TERM the recorded processes and wait (bounded) for them to exit, in one SSH call.
+
+    Returning only once they are gone means their sockets are released and their
+    output files flushed, so callers need no settle-time sleep. Unknown or stale
+    pidfiles are ignored.
+    """
+    files = " ".join(_pidfile(n) for n in (names or BG_PROCS))
+    polls = int(timeout * 10)
+    node.execute(
+        f"pids=$(cat {files} 2>/dev/null); rm -f {files}; "
+        f"[ -n \"$pids\" ] && kill -TERM $pids 2>/dev/null; "
+        f"for i in $(seq {polls}); do alive=; "
+        f"for p in $pids; do kill -0 $p 2>/dev/null && alive=1; done; "
+        f"[ -z \"$alive\" ] && break; sleep 0.1; done; true",
+        quiet=True)
+
+def bg_alive(node, name):
+    """True while the process recorded under name is still running on node."""
+    stdout, _ = node.execute(f"kill -0 $(cat {_pidfile(name)} 2>/dev/null) 2>/dev/null && echo COZARD_ALIVE",
+                             quiet=True)
+    return "COZARD_ALIVE" in (stdout or "")
+
+def run_for(node, name, duration, poll=5):
+    """Sleep up to duration seconds, returning early if the named process exits.
+
+    Returns True if the process was still alive at the end of the window.
+    """
+    deadline = time.monotonic() + duration
+    while (remaining := deadline - time.monotonic()) > 0:
+        time.sleep(min(poll, remaining))
+        if not bg_alive(node, name):
+            return False
+    return True
+
+def run_batch(node, commands, quiet=False):
+    """Run shell commands as root in one SSH exchange via a quoted heredoc.
+
+    Commands run in sequence without ``set -e``, matching separate execute() calls.
+    """
+    script = "\n".join(commands)
+    return node.execute(f"sudo bash -s <<'COZARD_EOF'\n{script}\nCOZARD_EOF", quiet=quiet)
+
+def _configure_endpoint(node, addr, peer_subnet, gateway, forward):
+    """Address an end host, route the far subnet via the router and open its firewall.
+
+    Retries to ride out SSH instability right after a reboot.
+    """
+    for attempt in range(3):
+        try:
+            ifaces = get_data_interfaces(node)
+            if ifaces:
+                run_batch(node, [
+                    f"ip addr flush dev {ifaces[0]}",
+                    f"ip addr add {addr}/24 dev {ifaces[0]}",
+                    f"ip link set dev {ifaces[0]} up",
+                    "sysctl -w net.ipv4.ip_forward=1" if forward else ":",
+                    f"ip route add {peer_subnet} via {gateway}",
+                    # Flush IPTABLES to allow ICE/UDP
+                    "iptables -F",
+                    "iptables -X",
+                    "iptables -P INPUT ACCEPT",
+                    "iptables -P FORWARD ACCEPT",
+                    "iptables -P OUTPUT ACCEPT",
+                    # Allow redirected ICMP just in case, but prefer DROP for experiment
+                    "iptables -I INPUT -p icmp --icmp-type redirect -j DROP",
+                ])
+            return True
+        except Exception as e:
+            logger.warning(f"Configuring {node.get_name()} failed (Attempt {attempt+1}/3): {e}")
+            time.sleep(5)
+    logger.error(f"Failed to configure {node.get_name()} after 3 attempts.")
+    return False
+
+def configure_routed_network(nodes):
     logger.info("\n[NETWORK] Configuring L3 Routing...")
-    gamer = slice.get_node('gamer-a')
-    router = slice.get_node('router-c')
-    receiver = slice.get_node('receiver-b')
-    attacker = slice.get_node('attacker-d')
+    gamer = nodes['gamer-a']
+    router = nodes['router-c']
+    receiver = nodes['receiver-b']
+    attacker = nodes['attacker-d']
     
     r_ifaces = get_data_interfaces(router)
     if not r_ifaces: return
     r_iface = r_ifaces[0]
-    router.execute(f"sudo ip addr flush dev {r_iface}")
-    router.execute(f"sudo ip addr add 192.168.10.1/24 dev {r_iface}")
-    router.execute(f"sudo ip addr add 192.168.20.1/24 dev {r_iface}")
-    router.execute(f"sudo ip link set dev {r_iface} up")
-    
-    # Disable Offloads for accurate TC (Aggressive)
-    router.execute(f"sudo ethtool -K {r_iface} tso off gso off gro off sg off", quiet=True)
-    
-    router.execute("sudo sysctl -w net.ipv4.ip_forward=1")
-    router.execute("sudo sysctl -w net.ipv4.conf.all.send_redirects=0")
+    run_batch(router, [
+        f"ip addr flush dev {r_iface}",
+        f"ip addr add 192.168.10.1/24 dev {r_iface}",
+        f"ip addr add 192.168.20.1/24 dev {r_iface}",
+        f"ip link set dev {r_iface} up",
+        # Disable Offloads for accurate TC (Aggressive)
+        f"ethtool -K {r_iface} tso off gso off gro off sg off >/dev/null 2>&1",
+        "sysctl -w net.ipv4.ip_forward=1",
+        "sysctl -w net.ipv4.conf.all.send_redirects=0",
+    ])
     
-    # Configure Nodes with Retry Logic (Handle SSH Instability after Reboot)
-    for node, ip in [(gamer, '10.2'), (attacker, '10.3')]:
-        for attempt in range(3):
-            try:
-                ifaces = get_data_interfaces(node)
-                if ifaces:
-                    node.execute(f"sudo ip addr flush dev {ifaces[0]}")
-                    node.execute(f"sudo ip addr add 192.168.{ip}/24 dev {ifaces[0]}")
-                    node.execute(f"sudo ip link set dev {ifaces[0]} up")
-                    # Enable IP Forwarding on the router
-                    node.execute("sudo sysctl -w net.ipv4.ip_forward=1")
-                    node.execute(f"sudo ip route add 192.168.20.0/24 via 192.168.10.1")
-                    # Flush IPTABLES to allow ICE/UDP
-                    node.execute("sudo iptables -F") 
-                    node.execute("sudo iptables -X")
-                    node.execute("sudo iptables -P INPUT ACCEPT")
-                    node.execute("sudo iptables -P FORWARD ACCEPT")
-                    node.execute("sudo iptables -P OUTPUT ACCEPT")
-                    # Allow redirected ICMP just in case, but prefer DROP for experiment
-                    node.execute("sudo iptables -I INPUT -p icmp --icmp-type redirect -j DROP")
-                break # Success
-            except Exception as e:
-                logger.warning(f"Configuring {node.get_name()} failed (Attempt {attempt+1}/3): {e}")
-                time.sleep(5)
-        else:
-            logger.error(f"Failed to configure {node.get_name()} after 3 attempts.")
-
-    rec_ifaces = get_data_interfaces(receiver)
-    if rec_ifaces:
-        receiver.execute(f"sudo ip addr flush dev {rec_ifaces[0]}")
-        receiver.execute(f"sudo ip addr add 192.168.20.2/24 dev {rec_ifaces[0]}")
-        receiver.execute(f"sudo ip link set dev {rec_ifaces[0]} up")
-        receiver.execute(f"sudo ip route add 192.168.10.0/24 via 192.168.20.1")
-        receiver.execute("sudo iptables -F")
-        receiver.execute("sudo iptables -X")
-        receiver.execute("sudo iptables -P INPUT ACCEPT")
-        receiver.execute("sudo iptables -P FORWARD ACCEPT")
-        receiver.execute("sudo iptables -P OUTPUT ACCEPT")
-        receiver.execute("sudo iptables -I INPUT -p icmp --icmp-type redirect -j DROP")
+    # Endpoints are independent once the router is up: configure them concurrently
+    endpoints = [
+        (gamer, '192.168.10.2', '192.168.20.0/24', '192.168.10.1', True),
+        (attacker, '192.168.10.3', '192.168.20.0/24', '192.168.10.1', True),
+        (receiver, '192.168.20.2', '192.168.10.0/24', '192.168.20.1', False),
+    ]
+    with ThreadPoolExecutor(max_workers=len(endpoints)) as ex:
+        list(ex.map(lambda e: _configure_endpoint(*e), endpoints))
 
     for n in [gamer, router, receiver, attacker]:
         n.execute("sudo ip route flush cache", quiet=True)
@@ -116,13 +225,20 @@ def configure_routed_network(slice):
     if nstat[0]:
         logger.info(f"ICMP Redirect Stats:\n{nstat[0].strip()}")
 
+# Survives reboots but not a reimage, which is exactly when the check must rerun
+GPU_OK_MARKER = "/etc/cozard.gpu-ok"
+
 def check_and_install_gpu_drivers(slice, node):
     logger.info(f"Checking GPU drivers on {node.get_name()}...")
-    # Check if nvidia-smi works
-    # Check if nvidia-smi works and returns valid status
-    stdout, stderr = node.execute("nvidia-smi", quiet=True)
+    # A node verified on an earlier run carries the marker; otherwise check if
+    # nvidia-smi works and returns valid status. Either way, one SSH call.
+    stdout, stderr = node.execute(f"test -f {GPU_OK_MARKER} && echo COZARD_GPU_OK || nvidia-smi", quiet=True)
+    if stdout and "COZARD_GPU_OK" in stdout:
+        logger.info(f"GPU stack previously verified on {node.get_name()}.")
+        return
     if stdout and ("Driver Version:" in stdout or "Tesla T4" in stdout):
         logger.info(f"GPU Drivers already operational on {node.get_name()}.")
+        node.execute(f"sudo touch {GPU_OK_MARKER}", quiet=True)
         return
 
     logger.info(f"GPU Drivers missing on {node.get_name()}. Installing (this takes ~5-10 mins)...")
@@ -134,13 +250,10 @@ def check_and_install_gpu_drivers(slice, node):
     
     # Reboot
     logger.info(f"Rebooting {node.get_name()} to load drivers...")
-    try:
-        node.execute("sudo reboot", quiet=True)
-    except: pass
-    
-    time.sleep(20)
     logger.info(f"Waiting for {node.get_name()} to reconnect...")
-    slice.wait_ssh(timeout=600) # Give it plenty of time
+    if not reboot_and_wait(node, timeout=600): # Give it plenty of time
+        logger.error(f"{node.get_name()} is still down after the driver reboot; skipping GPU verification.")
+        return
     
     # Verify
     stdout, stderr = node.execute("nvidia-smi", quiet=True)
@@ -206,6 +319,7 @@ def check_and_install_gpu_drivers(slice, node):
     stdout, _ = node.execute("gst-inspect-1.0 nvh264dec", quiet=True)
     if "Factory Details" in stdout:
         logger.info(f"SUCCESS: GStreamer repaired on {node.get_name()}.")
+        node.execute(f"sudo touch {GPU_OK_MARKER}", quiet=True)
     else:
         logger.error(f"CRITIAL FAIL: Could not enable GPU acceleration on {node.get_name()}. Starting diagnostics...")
         
@@ -224,11 +338,56 @@ def check_and_install_gpu_drivers(slice, node):
         logger.info("Checking ldconfig cache for nvidia:")
         node.execute("ldconfig -p | grep nvidia", quiet=False)
 
-def setup_nodes(slice):
+GAME_CLIP_URL = "http://commondatastorage.googleapis.com/gtv-videos-bucket/sample/ForBiggerBlazes.mp4"
+
+def fetch_game_clip(path):
+    """Download the clip once on this machine and reuse it across runs; None if unavailable."""
+    if not os.path.exists(path):
+        logger.info(f"Downloading game clip to {path}...")
+        try:
+            urllib.request.urlretrieve(GAME_CLIP_URL, path + ".part")
+            os.replace(path + ".part", path)
+        except OSError as e:
+            logger.warning(f"Could not download game clip: {e}")
+            return None
+    return path
+
+def make_bundle(files):
+    """Pack (local_path, remote_name) pairs into a temp tar; missing files are skipped.
+
+    One SFTP upload plus one tar extract replaces a session per file.
+    """
+    fd, bundle = tempfile.mkstemp(suffix=".tar")
+    with os.fdopen(fd, "wb") as f, tarfile.open(fileobj=f, mode="w") as tar:
+        for local_path, remote_name in files:
+            try:
+                tar.add(local_path, arcname=remote_name)
+            except OSError as e:
+                logger.warning(f"Could not bundle {remote_name} (check path): {e}")
+    return bundle
+
+def _setup_node(slice, node, bundle):
+    logger.info(f"Setting up {node.get_name()}...")
+    # Upload (scripts, requirements and, for the gamer, the clip) as one tarball
+    try:
+        node.upload_file(bundle, "cozard_bundle.tar")
+        node.execute("tar xf cozard_bundle.tar && rm -f cozard_bundle.tar", quiet=True)
+    except Exception as e:
+        logger.warning(f"Could not upload files to {node.get_name()}: {e}")
+    
+    # System Deps
+    # Install NVIDIA Drivers (Reboot if needed)
+    check_and_install_gpu_drivers(slice, node)
+    
+    node.execute("sudo DEBIAN_FRONTEND=noninteractive apt-get -o Dpkg::Use-Pty=0 install -y python3-pip libopencv-dev python3-opencv iperf3 libgstreamer1.0-dev gstreamer1.0-tools gstreamer1.0-plugins-base gstreamer1.0-plugins-good gstreamer1.0-plugins-bad gstreamer1.0-plugins-ugly gstreamer1.0-libav python3-gi", quiet=True)
+    # Python Deps
+    node.execute("pip3 install -r requirements.txt", quiet=True)
+
+def setup_nodes(slice, nodes):
     """Uploads scripts and installs dependencies on Gamer and Receiver"""
     logger.info("\n[SETUP] Setting up Game Nodes (This may take a while)...")
-    gamer = slice.get_node('gamer-a')
-    receiver = slice.get_node('receiver-b')
+    gamer = nodes['gamer-a']
+    receiver = nodes['receiver-b']
     
     # Files to upload
     script_dir = os.path.dirname(os.path.realpath(__file__))
@@ -239,35 +398,32 @@ def setup_nodes(slice):
         (os.path.join(script_dir, "monitor_webrtc.py"), "monitor_webrtc.py"),
         (os.path.join(root_dir, "requirements.txt"), "requirements.txt")
     ]
+    # Only the sender plays the clip; it falls back to a test pattern if it's missing
+    clip = fetch_game_clip(os.path.join(root_dir, "game_clip.mp4"))
+    gamer_files = files + [(clip, "game_clip.mp4")] if clip else files
+    bundles = [(gamer, make_bundle(gamer_files)), (receiver, make_bundle(files))]
     
-    for node in [gamer, receiver]:
-        logger.info(f"Setting up {node.get_name()}...")
-        # Upload
-        for local_path, remote_name in files:
-            try:
-                node.upload_file(local_path, remote_name)
-            except Exception as e:
-                logger.warning(f"Could not upload {remote_name} (check path): {e}")
-        
-        # System Deps
-        # Install NVIDIA Drivers (Reboot if needed)
-        check_and_install_gpu_drivers(slice, node)
-        
-        node.execute("sudo DEBIAN_FRONTEND=noninteractive apt-get install -y python3-pip libopencv-dev python3-opencv iperf3 libgstreamer1.0-dev gstreamer1.0-tools gstreamer1.0-plugins-base gstreamer1.0-plugins-good gstreamer1.0-plugins-bad gstreamer1.0-plugins-ugly gstreamer1.0-libav python3-gi", quiet=True)
-        
-        node.execute("sudo DEBIAN_FRONTEND=noninteractive apt-get install -y python3-pip libopencv-dev python3-opencv iperf3 libgstreamer1.0-dev gstreamer1.0-tools gstreamer1.0-plugins-base gstreamer1.0-plugins-good gstreamer1.0-plugins-bad gstreamer1.0-plugins-ugly gstreamer1.0-libav python3-gi", quiet=True)
-        # Download Video Clip
-        node.execute("wget -O game_clip.mp4 http://commondatastorage.googleapis.com/gtv-videos-bucket/sample/ForBiggerBlazes.mp4 2>&1", quiet=True)
-        
-        # Python Deps
-        node.execute("pip3 install -r requirements.txt", quiet=True)
+    # Independent nodes, each with a possible driver reboot: set them up side by side
+    try:
+        with ThreadPoolExecutor(max_workers=2) as ex:
+            for fut in [ex.submit(_setup_node, slice, node, bundle) for node, bundle in bundles]:
+                fut.result()
+    finally:
+        for _, bundle in bundles:
+            os.remove(bundle)
 
-def install_bbrv3_kernel(slice, node):
-    # 1. Ensure iperf3 is installed (needed for attack)
-    node.execute("sudo DEBIAN_FRONTEND=noninteractive apt-get update && sudo DEBIAN_FRONTEND=noninteractive apt-get install -y iperf3", quiet=True)
+BBR_SYSCTL = "net.ipv4.tcp_congestion_control=bbr"
 
-    # 2. Check Kernel
-    kernel = node.execute("uname -r", quiet=True)[0].strip()
+def install_bbrv3_kernel(node):
+    # 1. Ensure iperf3 is installed (needed for attack); skip apt entirely on warm nodes
+    if not node.execute("command -v iperf3", quiet=True)[0].strip():
+        node.execute("sudo DEBIAN_FRONTEND=noninteractive apt-get update && sudo DEBIAN_FRONTEND=noninteractive apt-get install -y iperf3", quiet=True)
+
+    # 2. Check Kernel, selecting BBR in the same round trip so the attack's
+    # first connection doesn't pay for the module autoload
+    out = node.execute(f"uname -r; sudo modprobe tcp_bbr && sudo sysctl -qw {BBR_SYSCTL}", quiet=True)[0]
+    lines = (out or "").split()
+    kernel = lines[0] if lines else ""
     if "bbrv3" in kernel:
         logger.info(f"Node {node.get_name()} already has BBRv3 ({kernel}).")
         return
@@ -277,23 +433,21 @@ def install_bbrv3_kernel(slice, node):
     headers = "linux-headers-6.4.0-bbrv3_6.4.0-g7542cc7c41c0-1_amd64.deb"
     image = "linux-image-6.4.0-bbrv3_6.4.0-g7542cc7c41c0-1_amd64.deb"
     
-    # Download
-    node.execute(f"wget -q {base_url}/{headers}")
-    node.execute(f"wget -q {base_url}/{image}")
+    # Download both debs concurrently in one SSH call
+    node.execute(f"wget -q {base_url}/{headers} & wget -q {base_url}/{image} & wait")
     
     # Install
     logger.info("Installing DEB packages...")
-    node.execute(f"sudo DEBIAN_FRONTEND=noninteractive dpkg -i {headers} {image}", quiet=True)
+    node.execute(f"sudo DEBIAN_FRONTEND=noninteractive dpkg -i {headers} {image} && "
+                 f"echo tcp_bbr | sudo tee /etc/modules-load.d/cozard-bbr.conf >/dev/null && "
+                 f"echo {BBR_SYSCTL} | sudo tee /etc/sysctl.d/90-cozard-bbr.conf >/dev/null", quiet=True)
     
     # Reboot to load
     logger.info("Rebooting node... (This will take 1-2 minutes)")
-    try:
-        node.execute("sudo reboot", quiet=True)
-    except: pass 
-    
-    time.sleep(20) # Give it a moment to go down
     logger.info("Waiting for node to come back online...")
-    slice.wait_ssh(timeout=300)
+    if not reboot_and_wait(node, timeout=300):
+        logger.error(f"FAIL: {node.get_name()} did not come back after the kernel install!")
+        sys.exit(1)
     
     # Verify
     new_kernel = node.execute("uname -r", quiet=True)[0].strip()
@@ -303,22 +457,52 @@ def install_bbrv3_kernel(slice, node):
         logger.error(f"FAIL: Still running {new_kernel} after reboot!")
         sys.exit(1)
 
+def interface_mbps(rows):
+    """Receiver NIC throughput over the monitor's recorded window, from its rx_bytes column."""
+    if rows is None or rows.size < 2 or 'rx_bytes' not in rows.dtype.names:
+        return float('nan')
+    rx = rows['rx_bytes'][~np.isnan(rows['rx_bytes'])]
+    ts = rows['timestamp'][~np.isnan(rows['rx_bytes'])]
+    if rx.size < 2 or ts[-1] <= ts[0]:
+        return float('nan')
+    return (rx[-1] - rx[0]) * 8 / ((ts[-1] - ts[0]) * 1_000_000)
+
+def parse_iperf_json(path):
+    """Attack throughput in Mbps from an iperf3 -J report.
+
+    The client is killed before its 60s run ends, so the final ``end`` totals are
+    often missing; fall back to the mean of the per-interval sums.
+    """
+    with open(path) as f:
+        report = json.load(f)
+    total = report.get("end", {}).get("sum_received", {}).get("bits_per_second")
+    if total:
+        return total / 1e6
+    rates = [iv["sum"]["bits_per_second"] for iv in report.get("intervals", []) if "sum" in iv]
+    logger.info(f"Parsed rates: {[round(r / 1e6, 2) for r in rates]}")
+    return sum(rates) / len(rates) / 1e6 if rates else float('nan')
+
 def run_experiment(slice):
     logger.info("\n" + "="*60)
     logger.info("RUNNING EXPERIMENT")
     
-    gamer = slice.get_node('gamer-a')
-    router = slice.get_node('router-c')
-    receiver = slice.get_node('receiver-b')
-    attacker = slice.get_node('attacker-d')
-    
-    setup_nodes(slice)
+    # Resolve each node once; fablib scans its node list on every get_node()
+    nodes = {name: slice.get_node(name) for name in NODE_NAMES}
+    gamer = nodes['gamer-a']
+    router = nodes['router-c']
+    receiver = nodes['receiver-b']
+    attacker = nodes['attacker-d']
     
-    # Enable BBR on attacker (Check/Install Kernel First)
-    install_bbrv3_kernel(slice, attacker)
-    attacker.execute("sudo modprobe tcp_bbr && sudo sysctl -w net.ipv4.tcp_congestion_control=bbr", quiet=True)
+    # Game-node setup and the attacker's kernel install (each with a possible
+    # reboot) touch disjoint nodes, so overlap them
+    with ThreadPoolExecutor(max_workers=2) as ex:
+        setup = ex.submit(setup_nodes, slice, nodes)
+        # Enable BBR on attacker (Check/Install Kernel First)
+        kernel = ex.submit(install_bbrv3_kernel, attacker)
+        setup.result()
+        kernel.result()
     
-    configure_routed_network(slice)
+    configure_routed_network(nodes)
     
     # Updated Phases with Loss parameter
     phases = [
@@ -330,8 +514,22 @@ def run_experiment(slice):
     final_results = []
     
     try:
+        # Clear anything left over from an interrupted run; each phase stops its own processes
+        for n in [gamer, receiver, attacker]:
+            stop_bg(n)
+
+        # One iperf3 server serves both attack phases (it takes one test at a time)
+        logger.info("Starting iperf3 Server (Receiver)...")
+        start_bg(receiver, "iperf3_server", "iperf3 -s -p 5202")
+        iperf_up = wait_for_port(receiver, 5202)
+        if not iperf_up:
+            logger.error("iperf3 server never started listening; attack phases will be skipped")
+
         for phase in phases:
             logger.info(f"\n--- PHASE: {phase['desc']} ---")
+            if phase['attack'] and not iperf_up:
+                logger.error(f"Skipping phase {phase['name']}: no iperf3 server to attack against")
+                continue
             
             # ROUTER CONFIG
             r_ifaces = get_data_interfaces(router)
@@ -358,35 +556,32 @@ def run_experiment(slice):
                 
                 router.execute(cmd)
 
-            # Cleanup
-            for n in [gamer, receiver, attacker]:
-                n.execute("pkill -f python3", quiet=True)
-                n.execute("pkill -f iperf3", quiet=True)
-            time.sleep(2)
-            
             # Start Receiver (Monitor) with Logging
             logger.info("Starting WebRTC Monitor (Receiver)...")
             # Redirect stdout/stderr to monitor.log for debugging 0 FPS issue
-            receiver.execute_thread("python3 monitor_webrtc.py --port 8888 --local-ip 192.168.20.2 --output gaming_metrics.csv > monitor.log 2>&1")
-
-            if phase['attack']:
-                logger.info("Starting iperf3 Server (Receiver)...")
-                receiver.execute_thread("iperf3 -s -p 5202")
-
-            time.sleep(5) 
+            rec_iface = get_data_interfaces(receiver)[0]
+            start_bg(receiver, "monitor", f"python3 -u monitor_webrtc.py --port 8888 --local-ip 192.168.20.2 --iface {rec_iface} --output gaming_metrics.csv > monitor.log 2>&1")
+
+            # Proceed as soon as the monitor is accepting rather than after a fixed 5s.
+            # Without it the phase would only record zeros that look like a measurement
+            if not wait_for_port(receiver, 8888):
+                logger.error(f"Skipping phase {phase['name']}: monitor never listened; see monitor_{phase['name']}.log")
+                stop_bg(receiver, "monitor")
+                download_all([(receiver, f"monitor_{phase['name']}.log", "monitor.log")])
+                continue
             
             # Start Ping Logger (Background)
             logger.info("Starting Ping Logger (RTT Trends)...")
             ping_cmd = f"ping -i 0.2 -D 192.168.20.2 > ping_{phase['name']}.log"
-            gamer.execute_thread(ping_cmd)
+            start_bg(gamer, "ping", ping_cmd)
 
             # Start Attack
             attack_throughput = 0.0
             if phase['attack']:
                 logger.info("Launching BBRv3 Attack...")
-                attacker.execute("rm -f attack.log", quiet=True)
+                attacker.execute("rm -f attack.json", quiet=True)
                 # Extend attack to 60s to ensure full overlap with 40s game stream (avoiding 'happy ending' bias)
-                attacker.execute_thread("iperf3 -c 192.168.20.2 -p 5202 -C bbr -P 5 -t 60 --logfile attack.log")
+                start_bg(attacker, "iperf3_client", "iperf3 -c 192.168.20.2 -p 5202 -C bbr -P 5 -t 60 -J --logfile attack.json")
                 time.sleep(5)
             else:
                  # Align baseline timing with attack phases (which have 5s warmup)
@@ -395,97 +590,58 @@ def run_experiment(slice):
             
             # Start Gamer (Sender)
             logger.info("Starting WebRTC Stream (Gamer)...")
-            gamer.execute_thread(f"python3 gamer_webrtc.py --receiver-ip 192.168.20.2 --port 8888 > gamer.log 2>&1")
+            start_bg(gamer, "gamer", f"python3 -u gamer_webrtc.py --receiver-ip 192.168.20.2 --port 8888 > gamer.log 2>&1")
             
-            rec_iface = get_data_interfaces(receiver)[0]
-            start_bytes = int(receiver.execute(f"cat /sys/class/net/{rec_iface}/statistics/rx_bytes", quiet=True)[0].strip())
-            
-            # Run for 40s
-            time.sleep(40)
-            
-            end_bytes = int(receiver.execute(f"cat /sys/class/net/{rec_iface}/statistics/rx_bytes", quiet=True)[0].strip())
+            # Run for 40s, but don't sit out the window if the sender died
+            if not run_for(gamer, "gamer", 40):
+                logger.error(f"Gamer exited early in phase {phase['name']}; see gamer.log")
             
             # Stop Everything
-            gamer.execute("pkill -f python3", quiet=True)
-            gamer.execute("pkill -f ping", quiet=True)
-            receiver.execute("pkill -f python3", quiet=True)
+            stop_bg(gamer, "gamer", "ping")
+            stop_bg(receiver, "monitor")
             if phase['attack']:
-                 attacker.execute("pkill -f iperf3", quiet=True)
+                 stop_bg(attacker, "iperf3_client")
 
             # Log TC stats after run to see if packets were dropped/queued
             if r_ifaces:
                 logger.info("TC Stats AFTER run:")
                 router.execute(f"tc -s qdisc show dev {iface}")
 
-            time.sleep(2)
-
             logger.info("Processing metrics...")
             
-            # Total Throughput (Receiver Interface)
-            total_bytes = end_bytes - start_bytes
-            total_mbps = (total_bytes * 8) / (40 * 1_000_000) # Mbps over 40s
-            
+            # Ping log, debug logs, attack report and monitor CSV are independent transfers
+            phase_metrics_file = f"metrics_{phase['name']}.csv"
+            attack_file = f"attack_{phase['name']}.json"
+            downloads = [
+                (gamer, f"ping_{phase['name']}.log", f"ping_{phase['name']}.log"),
+                (receiver, f"monitor_{phase['name']}.log", "monitor.log"),
+                (gamer, f"gamer_{phase['name']}.log", "gamer.log"),
+                (receiver, phase_metrics_file, "gaming_metrics.csv"),
+            ]
+            if phase['attack']:
+                downloads.append((attacker, attack_file, "attack.json"))
+            logger.info(f"Downloading logs for phase {phase['name']}...")
+            failed = download_all(downloads)
+
+            rows = None
             try:
-                # Ping Logs (from Gamer)
-                logger.info(f"Downloading ping log: ping_{phase['name']}.log")
-                gamer.download_file(f"ping_{phase['name']}.log", f"ping_{phase['name']}.log")
-                
-                logger.info(f"Downloading debug logs...")
-                receiver.download_file(f"monitor_{phase['name']}.log", "monitor.log") 
-                gamer.download_file(f"gamer_{phase['name']}.log", "gamer.log")
+                if phase_metrics_file in failed:
+                    raise FileNotFoundError(f"{phase_metrics_file} was not downloaded")
+                rows = np.atleast_1d(np.genfromtxt(phase_metrics_file, delimiter=',', names=True))
             except Exception as e:
-                logger.warning(f"Failed to download logs for phase {phase['name']}: {e}")
+                logger.error(f"Failed to read Game Metrics for {phase['name']}: {e}")
+
+            # Total Throughput (Receiver Interface), from the monitor's per-row rx_bytes
+            total_mbps = interface_mbps(rows)
 
             # Attack Throughput (iperf3)
             if phase['attack']:
                 try:
-                    attacker.download_file("attack.log", "attack.log")
-                    with open("attack.log", 'r') as f:
-                        lines = f.readlines()
-                        rates = []
-                        
-                        # Detect if we have SUM lines (multi-stream)
-                        has_sum = any("[SUM]" in line for line in lines)
-                        
-                        for line in lines:
-                            # Determine if we should parse this line
-                            parse_line = False
-                            if has_sum and "[SUM]" in line:
-                                parse_line = True
-                            elif not has_sum and "[  " in line: # Standard flow line
-                                # Exclude [ ID] lines
-                                if "[ ID]" not in line:
-                                    parse_line = True
-                            
-                            if parse_line and "bits/sec" in line:
-                                parts = line.split()
-                                try:
-                                    # Find the number before the unit
-                                    # "2.29 Gbits/sec" or "981 Mbits/sec"
-                                    for i, part in enumerate(parts):
-                                        if "bits/sec" in part: # Mbits/sec, Gbits/sec, Kbits/sec
-                                            # Value is at i-1
-                                            val_str = parts[i-1]
-                                            val = float(val_str)
-                                            unit = part
-                                            
-                                            # Normalize to Mbps
-                                            if "Gbits" in unit: val *= 1000
-                                            elif "Kbits" in unit: val /= 1000
-                                            # Mbits is default
-                                            
-                                            rates.append(val)
-                                            break
-                                except: 
-                                    pass
-                        
-                        logger.info(f"Parsed rates: {rates}")
-                        if rates:
-                            attack_throughput = sum(rates) / len(rates)
-                        else:
-                            logger.warning("Log empty or parse error, assuming saturation.")
-                            attack_throughput = float('nan')
-
+                    if attack_file in failed:
+                        raise FileNotFoundError(f"{attack_file} was not downloaded")
+                    attack_throughput = parse_iperf_json(attack_file)
+                    if math.isnan(attack_throughput):
+                        logger.warning("Log empty or parse error, assuming saturation.")
                 except Exception as e:
                     logger.warning(f"Could not read attack throughput: {e}")
                     attack_throughput = float('nan')
@@ -497,53 +653,32 @@ def run_experiment(slice):
             # Game Quality (FPS/Stalls)
             r_avg_fps = 0
             r_stall_time = 0
-            try:
-                # Save unique file for this phase
-                phase_metrics_file = f"metrics_{phase['name']}.csv"
-                receiver.download_file(phase_metrics_file, "gaming_metrics.csv")
-                
-                with open(phase_metrics_file, 'r') as f:
-                    reader = csv.DictReader(f)
-                    rows = list(reader)
-                    if rows:
-                        r_avg_fps = sum(float(r['fps']) for r in rows) / len(rows)
-                        r_stall_time = sum(float(r['stall_duration_ms']) for r in rows)
-                        # Use Application-Layer Bitrate
-                        if 'bitrate_mbps' in rows[0]:
-                             game_mbps = sum(float(r['bitrate_mbps']) for r in rows) / len(rows)
-                        else:
-                             # Fallback if column missing
-                             logger.warning("bitrate_mbps column missing in metrics CSV!")
-            except Exception as e:
-                logger.error(f"Failed to read Game Metrics for {phase['name']}: {e}")
-
-            # Jain's Fairness Index
-            j_index = float("nan")
-
-            if phase['attack']:
-                game = game_mbps
-                attack = attack_throughput
-
-                if math.isnan(game) or (math.isnan(attack) and phase['attack']):
-                    logger.warning(
-                        f"Skipping Jain index for {phase['name']} due to NaN throughput "
-                        f"(game={game}, attack={attack})"
-                    )
-                elif not phase['attack'] or attack == 0:
-                     # Baseline or No Attack -> Perfect Fairness (Single User)
-                     j_index = 1.0
+            if rows is not None and rows.size:
+                r_avg_fps = float(rows['fps'].mean())
+                r_stall_time = float(rows['stall_duration_ms'].sum())
+                # Use Application-Layer Bitrate
+                if 'bitrate_mbps' in rows.dtype.names:
+                     game_mbps = float(rows['bitrate_mbps'].mean())
                 else:
-                    total_t = game + attack
-                    sum_sq = (game ** 2) + (attack ** 2)
-
-                    if total_t <= 0 or sum_sq <= 0:
-                        logger.warning(
-                            f"Non-positive throughput when computing Jain index for {phase['name']}: "
-                            f"game={game}, attack={attack}"
-                        )
-                        j_index = float("nan")
-                    else:
-                        j_index = (total_t ** 2) / (2 * sum_sq)
+                     # Fallback if column missing
+                     logger.warning("bitrate_mbps column missing in metrics CSV!")
+
+            # Jain's Fairness Index over the two flows; for N=2 with r = game/attack
+            # (x1+x2)^2 / (2*(x1^2+x2^2)) reduces to (1+r)^2 / (2*(1+r^2))
+            if not phase['attack']:
+                j_index = float("nan")
+            elif math.isnan(game_mbps) or math.isnan(attack_throughput):
+                logger.warning(
+                    f"Skipping Jain index for {phase['name']} due to NaN throughput "
+                    f"(game={game_mbps}, attack={attack_throughput})"
+                )
+                j_index = float("nan")
+            elif attack_throughput == 0:
+                # Attacker moved nothing -> single user, perfectly fair
+                j_index = 1.0
+            else:
+                r = game_mbps / attack_throughput
+                j_index = (1 + r) ** 2 / (2 * (1 + r * r))
             
             logger.info(f"Phase Result: FPS={r_avg_fps:.1f}, Stalls={r_stall_time:.0f}ms, Total_Interface={total_mbps:.1f}Mbps, Game_App={game_mbps:.2f}Mbps, Attack={attack_throughput:.2f}Mbps, Jain={j_index:.2f}")
 
@@ -559,15 +694,18 @@ def run_experiment(slice):
     finally:
         logger.info("\n[CLEANUP] Stopping processes...")
         for n in [gamer, receiver, attacker]:
-             n.execute("pkill -f python3", quiet=True)
-             n.execute("pkill -f iperf3", quiet=True)
+             stop_bg(n)
 
     # Final Report
     logger.info("Saving 'gaming_metrics.csv'...")
-    with open("gaming_metrics.csv", 'w', newline='') as f:
-        writer = csv.DictWriter(f, fieldnames=['phase', 'avg_fps', 'total_stall_ms', 'game_mbps', 'attack_mbps', 'j_index'])
-        writer.writeheader()
-        writer.writerows(final_results)
+    # Build in memory, then swap in atomically so plot_results never sees a partial file
+    buf = io.StringIO()
+    writer = csv.DictWriter(buf, fieldnames=['phase', 'avg_fps', 'total_stall_ms', 'game_mbps', 'attack_mbps', 'j_index'])
+    writer.writeheader()
+    writer.writerows(final_results)
+    with open("gaming_metrics.csv.tmp", 'w', newline='') as f:
+        f.write(buf.getvalue())
+    os.replace("gaming_metrics.csv.tmp", "gaming_metrics.csv")
 
     # Calculate Harm Factor 
     if len(final_results) >= 2:
@@ -602,8 +740,10 @@ def run_experiment(slice):
 
 def main():
     try:
-        fablib = fablib_manager()
-        slice = fablib.get_slice(name="cloud_gaming_experiment")
+        cache = load_slice_cache()
+        slice_name = cache["slice"] if cache else "cloud_gaming_experiment"
+        fablib = get_fablib()
+        slice = fablib.get_slice(name=slice_name)
         run_experiment(slice)
     except Exception as e:
         logger.error(e)